@@ -1,11 +1,11 @@
 """
 Database Helper Functions
 
-MongoDB helper functions ready to use in your backend code.
+Async MongoDB helper functions (Motor) ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
@@ -22,11 +22,23 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    # Module-level singleton reused across requests; Motor shares one connection
+    # pool sized for FastAPI concurrency. Wire compression shrinks list-endpoint
+    # payloads; pymongo skips compressors whose library isn't installed (zlib is
+    # stdlib, so at least that one always applies).
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=200,
+        minPoolSize=20,
+        maxIdleTimeMS=60000,
+        serverSelectionTimeoutMS=2000,
+        retryWrites=True,
+        compressors="zstd,snappy,zlib",
+    )
     db = _client[database_name]
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -40,16 +52,49 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def create_documents(collection_name: str, data_list):
+    """Insert many documents with timestamps in a single round-trip"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in data_list:
+        data_dict = data.model_dump() if isinstance(data, BaseModel) else data.copy()
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    result = await db[collection_name].insert_many(docs, ordered=False)
+    return [str(_id) for _id in result.inserted_ids]
+
+async def update_document(collection_name: str, filter_dict: dict, update_dict: dict):
+    """Update a single document and refresh its timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    update_dict = update_dict.copy()
+    update_dict['updated_at'] = datetime.now(timezone.utc)
+
+    result = await db[collection_name].update_one(filter_dict, {"$set": update_dict})
+    return result.modified_count
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, skip: int = 0, projection: dict = None):
+    """Get documents from collection with optional pagination and projection.
+
+    A limit of None or 0 means unlimited; API callers constrain their
+    limit/skip query parameters so negative values never reach the driver.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if skip:
+        cursor = cursor.skip(skip)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+
+    return await cursor.to_list(length=limit or None)
@@ -1,14 +1,27 @@
+import asyncio
+import base64
+import hashlib
+import hmac
 import os
-from datetime import datetime, timedelta, timezone
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Path, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
 import jwt
-from passlib.context import CryptContext
-
-from database import db, create_document, get_documents
+import orjson
+from redis import asyncio as aioredis
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
+import bcrypt
+from cachetools import TTLCache
+
+from database import db, create_document, create_documents, get_documents, update_document
 from schemas import User, Project, ScorecardMetric, ActionPlanItem, TimelineItem, Task, Comment, Document
 
 # Auth settings
@@ -16,34 +29,68 @@ JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change")
 JWT_ALGO = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 8
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ph = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=1)
+
+class MongoJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also renders BSON types (ObjectId via str)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+app = FastAPI(title="Governance & Internal Audit API", default_response_class=MongoJSONResponse)
 
-app = FastAPI(title="Governance & Internal Audit API")
+# Explicit origins instead of a wildcard, with a day-long preflight cache so
+# browsers stop re-issuing an OPTIONS round-trip before every API call.
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
+# List responses are JSON arrays that compress 5-10x; short bodies (tokens,
+# single documents) stay below the threshold and skip the deflate pass.
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=5)
+
 
 # ---------- Helpers ----------
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return ph.hash(password)
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+    if not hashed.startswith("$argon2"):
+        # Legacy bcrypt hash; re-hashed to argon2 on next successful login
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    try:
+        ph.verify(hashed, password)
+        return True
+    except VerifyMismatchError:
+        return False
+
+
+# Precomputed signer state: the header never changes and the HMAC key is fixed
+# at process start, so issuing a token is two base64url encodes plus one
+# hmac-sha256 call instead of PyJWT's per-call algorithm registry walk.
+_JWT_KEY = JWT_SECRET.encode()
+_JWT_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGO)
+    # exp only needs second precision; int arithmetic on time.time() skips
+    # building and subtracting datetime objects per token.
+    ttl = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    claims = {**data, "exp": int(time.time()) + ttl}
+    body = base64.urlsafe_b64encode(orjson.dumps(claims)).rstrip(b"=")
+    signing_input = _JWT_HEADER + b"." + body
+    sig = base64.urlsafe_b64encode(hmac.new(_JWT_KEY, signing_input, hashlib.sha256).digest()).rstrip(b"=")
+    return (signing_input + b"." + sig).decode()
 
 
 class TokenResponse(BaseModel):
@@ -57,6 +104,30 @@ class AuthPayload(BaseModel):
     name: Optional[str] = None
 
 
+# Token -> user cache for the auth hot path. A token is only inserted when its
+# exp outlasts the cache window (checked in get_current_user), so a cached
+# entry can never authenticate past its token's expiry.
+_USER_TTL = 60
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=_USER_TTL)
+
+# Token -> claims cache: skips base64 decode + HMAC verification for repeat
+# tokens (SPAs resend the same Authorization header on every XHR).
+_CLAIMS_TTL = 300
+_claims_cache: TTLCache = TTLCache(maxsize=4096, ttl=_CLAIMS_TTL)
+
+
+def _decode_token(token: str) -> Dict[str, Any]:
+    claims = _claims_cache.get(token)
+    if claims is not None:
+        return claims
+    claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+    # Only cache tokens that stay valid for the whole cache window, so a
+    # cached entry can never be served past its exp.
+    if claims.get("exp", 0) > time.time() + _CLAIMS_TTL:
+        _claims_cache[token] = claims
+    return claims
+
+
 async def get_current_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -64,33 +135,123 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Dict[
         scheme, token = authorization.split(" ")
         if scheme.lower() != "bearer":
             raise Exception("Invalid auth scheme")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+        hit = _user_cache.get(token)
+        if hit is not None:
+            return hit
+        payload = _decode_token(token)
         user_id = payload.get("sub")
         if not user_id:
             raise Exception("Invalid token")
         # Fetch user by email since we store sub=email for simplicity
-        users = get_documents("user", {"email": user_id}, limit=1)
+        users = await get_documents("user", {"email": user_id}, limit=1)
         if not users:
             raise Exception("User not found")
-        return users[0]
+        user = users[0]
+        # Stringify the ObjectId once; handlers read _id_str instead of
+        # converting on every request.
+        user["_id_str"] = str(user["_id"])
+        # Same guard as _decode_token: keep TTL <= the token's remaining
+        # lifetime, never just its total lifetime.
+        if payload.get("exp", 0) > time.time() + _USER_TTL:
+            _user_cache[token] = user
+        return user
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
 
+# Password hashing is CPU-bound (hundreds of ms by design); run it in worker
+# processes so concurrent auth requests don't serialize on the event loop.
+_hash_executor: Optional[ProcessPoolExecutor] = None
+
+
+@app.on_event("startup")
+def create_hash_executor():
+    global _hash_executor
+    _hash_executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, hash_password, password)
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, verify_password, password, hashed)
+
+
+@app.on_event("startup")
+async def create_indexes():
+    # Hot query fields: every list endpoint filters on one of these, and auth
+    # looks up user.email on each request. Indexed lookups instead of COLLSCANs.
+    if db is None:
+        return
+    try:
+        await db.user.create_index("email", unique=True)
+        await db.project.create_index("owner_id")
+        for collection in ("scorecardmetric", "actionplanitem", "timelineitem", "comment", "document"):
+            await db[collection].create_index("project_id")
+        await db.task.create_index("timeline_item_id")
+    except Exception:
+        # best-effort; an unavailable DB at boot shouldn't crash the app
+        pass
+
+
+
+# ---------- Redis query-result cache (optional) ----------
+# List results change only on writes to the same collection + parent id, so
+# they are cached as ready-to-send JSON and deleted from the write paths.
+# Only the default page (limit=100, skip=0, no projection) is cached, which
+# keeps invalidation a single DEL per key. Redis is optional and best-effort:
+# without REDIS_URL, or with Redis down, endpoints just hit Mongo.
+REDIS_URL = os.getenv("REDIS_URL")
+_redis = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+_QUERY_CACHE_TTL = 300
+
+
+def _cacheable(limit: int, skip: int, fields: Optional[str]) -> bool:
+    return limit == 100 and not skip and not fields
+
+
+async def cache_get(key: str) -> Optional[bytes]:
+    if _redis is None:
+        return None
+    try:
+        return await _redis.get(key)
+    except Exception:
+        return None
+
+
+async def cache_set(key: str, payload: bytes):
+    if _redis is None:
+        return
+    try:
+        await _redis.set(key, payload, ex=_QUERY_CACHE_TTL)
+    except Exception:
+        pass
+
+
+async def cache_invalidate(*keys: str):
+    if _redis is None or not keys:
+        return
+    try:
+        await _redis.delete(*keys)
+    except Exception:
+        pass
+
+
 # ---------- Startup seeding (dev convenience) ----------
 @app.on_event("startup")
-def ensure_test_user():
+async def ensure_test_user():
     try:
         if os.getenv("CREATE_TEST_USER", "1") != "1":
             return
         email = os.getenv("TEST_USER_EMAIL", "demo@demo.com")
         password = os.getenv("TEST_USER_PASSWORD", "demo1234")
         name = os.getenv("TEST_USER_NAME", "Demo User")
-        exists = get_documents("user", {"email": email}, limit=1)
+        exists = await get_documents("user", {"email": email}, limit=1)
         if not exists:
             hashed = hash_password(password)
             user = User(name=name, email=email, hashed_password=hashed, role="member")
-            create_document("user", user)
+            await create_document("user", user)
     except Exception:
         # best-effort; avoid crashing app on seed issues
         pass
@@ -99,40 +260,49 @@ def ensure_test_user():
 # ---------- Public Routes ----------
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Governance & Internal Audit API running"}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     try:
-        cols = db.list_collection_names() if db else []
-        return {"backend": "ok", "db": "ok" if db else "not_configured", "collections": cols}
+        cols = await db.list_collection_names() if db is not None else []
+        return {"backend": "ok", "db": "ok" if db is not None else "not_configured", "collections": cols}
     except Exception as e:
         return {"backend": "ok", "db": f"error: {str(e)}"}
 
 
 @app.post("/auth/register", response_model=TokenResponse)
-def register(payload: AuthPayload):
-    # Check if user exists
-    existing = get_documents("user", {"email": payload.email}, limit=1)
+async def register(payload: AuthPayload):
+    # Email-existence probe plus O(1) metadata count, issued concurrently.
+    # estimated_document_count reads collection metadata without touching a
+    # document, unlike the $facet branch it replaces.
+    existing, user_count = await asyncio.gather(
+        db.user.find_one({"email": payload.email}, {"_id": 1}),
+        db.user.estimated_document_count(),
+    )
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = hash_password(payload.password)
-    user = User(name=payload.name or payload.email.split("@")[0], email=payload.email, hashed_password=hashed, role="admin" if not get_documents("user") else "member")
-    _id = create_document("user", user)
+    hashed = await hash_password_async(payload.password)
+    user = User(name=payload.name or payload.email.split("@")[0], email=payload.email, hashed_password=hashed, role="admin" if user_count == 0 else "member")
+    _id = await create_document("user", user)
     token = create_access_token({"sub": payload.email})
     return TokenResponse(access_token=token)
 
 
 @app.post("/auth/login", response_model=TokenResponse)
-def login(payload: AuthPayload):
-    users = get_documents("user", {"email": payload.email}, limit=1)
+async def login(payload: AuthPayload):
+    users = await get_documents("user", {"email": payload.email}, limit=1)
     if not users:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     user = users[0]
-    if not verify_password(payload.password, user.get("hashed_password", "")):
+    hashed = user.get("hashed_password", "")
+    if not await verify_password_async(payload.password, hashed):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Migrate legacy bcrypt (or outdated argon2 parameters) on successful login
+    if not hashed.startswith("$argon2") or ph.check_needs_rehash(hashed):
+        await update_document("user", {"_id": user["_id"]}, {"hashed_password": await hash_password_async(payload.password)})
     token = create_access_token({"sub": payload.email})
     return TokenResponse(access_token=token)
 
@@ -144,20 +314,40 @@ class ProjectIn(BaseModel):
     description: Optional[str] = None
 
 
+def _parse_fields(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Turn a comma-separated ?fields= query value into a Mongo projection."""
+    if not fields:
+        return None
+    return {name: 1 for name in fields.split(",") if name}
+
+
 @app.post("/projects")
-def create_project(data: ProjectIn, current_user: dict = Depends(get_current_user)):
-    project = Project(name=data.name, description=data.description, owner_id=str(current_user.get("_id")))
-    _id = create_document("project", project)
-    return {"_id": _id, **project.model_dump()}
+async def create_project(data: ProjectIn, current_user: dict = Depends(get_current_user)):
+    doc = Project.model_construct(name=data.name, description=data.description, owner_id=current_user["_id_str"]).model_dump()
+    _id = await create_document("project", doc)
+    await cache_invalidate(f"project:{doc['owner_id']}")
+    return {"_id": _id, **doc}
 
 
 @app.get("/projects")
-def list_projects(current_user: dict = Depends(get_current_user)):
-    projects = get_documents("project", {"owner_id": str(current_user.get("_id"))})
-    return projects
-
+async def list_projects(limit: int = Query(100, ge=1), skip: int = Query(0, ge=0), fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    key = f"project:{current_user['_id_str']}"
+    if _cacheable(limit, skip, fields):
+        cached = await cache_get(key)
+        if cached is not None:
+            return Response(cached, media_type="application/json")
+    projects = await get_documents("project", {"owner_id": current_user["_id_str"]}, limit=limit, skip=skip, projection=_parse_fields(fields))
+    response = MongoJSONResponse(projects)
+    if _cacheable(limit, skip, fields):
+        await cache_set(key, response.body)
+    return response
+
+
+# ---------- Entity CRUD (generated) ----------
+# The six entity families below share the same three handlers (create, batch
+# create, list-by-parent). They are generated once from a table instead of
+# being copy-pasted per collection.
 
-# Scorecard
 class MetricIn(BaseModel):
     project_id: str
     title: str
@@ -168,20 +358,6 @@ class MetricIn(BaseModel):
     due_date: Optional[datetime] = None
 
 
-@app.post("/metrics")
-def add_metric(data: MetricIn, current_user: dict = Depends(get_current_user)):
-    metric = ScorecardMetric(**data.model_dump())
-    _id = create_document("scorecardmetric", metric)
-    return {"_id": _id, **metric.model_dump()}
-
-
-@app.get("/metrics/{project_id}")
-def get_metrics(project_id: str, current_user: dict = Depends(get_current_user)):
-    items = get_documents("scorecardmetric", {"project_id": project_id})
-    return items
-
-
-# Action plan
 class ActionIn(BaseModel):
     project_id: str
     title: str
@@ -191,20 +367,6 @@ class ActionIn(BaseModel):
     due_date: Optional[datetime] = None
 
 
-@app.post("/actions")
-def add_action(data: ActionIn, current_user: dict = Depends(get_current_user)):
-    action = ActionPlanItem(**data.model_dump())
-    _id = create_document("actionplanitem", action)
-    return {"_id": _id, **action.model_dump()}
-
-
-@app.get("/actions/{project_id}")
-def get_actions(project_id: str, current_user: dict = Depends(get_current_user)):
-    items = get_documents("actionplanitem", {"project_id": project_id})
-    return items
-
-
-# Timeline
 class TimelineIn(BaseModel):
     project_id: str
     type: str
@@ -214,20 +376,6 @@ class TimelineIn(BaseModel):
     end_date: Optional[datetime] = None
 
 
-@app.post("/timeline")
-def add_timeline_item(data: TimelineIn, current_user: dict = Depends(get_current_user)):
-    item = TimelineItem(**data.model_dump())
-    _id = create_document("timelineitem", item)
-    return {"_id": _id, **item.model_dump()}
-
-
-@app.get("/timeline/{project_id}")
-def get_timeline(project_id: str, current_user: dict = Depends(get_current_user)):
-    items = get_documents("timelineitem", {"project_id": project_id})
-    return items
-
-
-# Tasks under timeline items
 class TaskIn(BaseModel):
     project_id: str
     timeline_item_id: str
@@ -238,20 +386,6 @@ class TaskIn(BaseModel):
     due_date: Optional[datetime] = None
 
 
-@app.post("/tasks")
-def add_task(data: TaskIn, current_user: dict = Depends(get_current_user)):
-    task = Task(**data.model_dump())
-    _id = create_document("task", task)
-    return {"_id": _id, **task.model_dump()}
-
-
-@app.get("/tasks/{timeline_item_id}")
-def get_tasks(timeline_item_id: str, current_user: dict = Depends(get_current_user)):
-    items = get_documents("task", {"timeline_item_id": timeline_item_id})
-    return items
-
-
-# Comments
 class CommentIn(BaseModel):
     project_id: str
     content: str
@@ -259,20 +393,6 @@ class CommentIn(BaseModel):
     task_id: Optional[str] = None
 
 
-@app.post("/comments")
-def add_comment(data: CommentIn, current_user: dict = Depends(get_current_user)):
-    comment = Comment(**data.model_dump(), author_id=str(current_user.get("_id")))
-    _id = create_document("comment", comment)
-    return {"_id": _id, **comment.model_dump()}
-
-
-@app.get("/comments/{project_id}")
-def get_comments(project_id: str, current_user: dict = Depends(get_current_user)):
-    items = get_documents("comment", {"project_id": project_id})
-    return items
-
-
-# Documents (metadata only)
 class DocumentIn(BaseModel):
     project_id: str
     name: str
@@ -281,20 +401,54 @@ class DocumentIn(BaseModel):
     task_id: Optional[str] = None
 
 
-@app.post("/documents")
-def add_document(data: DocumentIn, current_user: dict = Depends(get_current_user)):
-    doc = Document(**data.model_dump(), uploaded_by=str(current_user.get("_id")))
-    _id = create_document("document", doc)
-    return {"_id": _id, **doc.model_dump()}
-
-
-@app.get("/documents/{project_id}")
-def get_documents_for_project(project_id: str, current_user: dict = Depends(get_current_user)):
-    items = get_documents("document", {"project_id": project_id})
-    return items
-
-
-if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+def register_crud(prefix: str, collection: str, SchemaIn: type, Schema: type, list_key: str = "project_id", user_field: Optional[str] = None):
+    """Register the create / batch-create / list-by-parent trio for one entity family.
+
+    list_key is both the path parameter of the list route and the Mongo filter
+    field; user_field, when set, is stamped with the caller's id on writes.
+    """
+
+    def _stamp(current_user: dict) -> dict:
+        return {user_field: current_user["_id_str"]} if user_field else {}
+
+    async def add_item(data: SchemaIn, current_user: dict = Depends(get_current_user)):
+        doc = Schema.model_construct(**data.model_dump(), **_stamp(current_user)).model_dump()
+        _id = await create_document(collection, doc)
+        await cache_invalidate(f"{collection}:{doc[list_key]}")
+        return {"_id": _id, **doc}
+
+    async def add_items_batch(data: List[SchemaIn], current_user: dict = Depends(get_current_user)):
+        if not data:
+            # insert_many rejects an empty list
+            return {"inserted_ids": []}
+        items = [Schema.model_construct(**d.model_dump(), **_stamp(current_user)) for d in data]
+        ids = await create_documents(collection, items)
+        await cache_invalidate(*{f"{collection}:{getattr(d, list_key)}" for d in data})
+        return {"inserted_ids": ids}
+
+    async def list_items(key: str = Path(alias=list_key), limit: int = Query(100, ge=1), skip: int = Query(0, ge=0), fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+        cache_key = f"{collection}:{key}"
+        if _cacheable(limit, skip, fields):
+            cached = await cache_get(cache_key)
+            if cached is not None:
+                return Response(cached, media_type="application/json")
+        items = await get_documents(collection, {list_key: key}, limit=limit, skip=skip, projection=_parse_fields(fields))
+        response = MongoJSONResponse(items)
+        if _cacheable(limit, skip, fields):
+            await cache_set(cache_key, response.body)
+        return response
+
+    app.post(f"/{prefix}", name=f"add_{collection}")(add_item)
+    app.post(f"/{prefix}/batch", name=f"add_{collection}_batch")(add_items_batch)
+    app.get(f"/{prefix}/{{{list_key}}}", name=f"list_{collection}")(list_items)
+
+
+for _family in (
+    ("metrics", "scorecardmetric", MetricIn, ScorecardMetric),
+    ("actions", "actionplanitem", ActionIn, ActionPlanItem),
+    ("timeline", "timelineitem", TimelineIn, TimelineItem),
+    ("tasks", "task", TaskIn, Task, "timeline_item_id"),
+    ("comments", "comment", CommentIn, Comment, "project_id", "author_id"),
+    ("documents", "document", DocumentIn, Document, "project_id", "uploaded_by"),
+):
+    register_crud(*_family)
@@ -7,12 +7,14 @@ lowercased class name. Example: class User -> collection "user".
 This app uses the database by default for persistence.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import datetime
 
 class User(BaseModel):
     """Users collection schema"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     name: str = Field(..., description="Full name")
     email: str = Field(..., description="Email address")
     hashed_password: str = Field(..., description="Password hash")
@@ -21,6 +23,8 @@ class User(BaseModel):
 
 class Project(BaseModel):
     """Project container for governance/audit initiatives"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     name: str
     description: Optional[str] = None
     owner_id: Optional[str] = Field(None, description="User id of owner")
@@ -28,6 +32,8 @@ class Project(BaseModel):
 
 class ScorecardMetric(BaseModel):
     """Balanced scorecard metric for the project"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     project_id: str
     title: str
     description: Optional[str] = None
@@ -38,6 +44,8 @@ class ScorecardMetric(BaseModel):
 
 class ActionPlanItem(BaseModel):
     """Action plan item with owner and due date"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     project_id: str
     title: str
     description: Optional[str] = None
@@ -47,6 +55,8 @@ class ActionPlanItem(BaseModel):
 
 class TimelineItem(BaseModel):
     """Timeline events for a project"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     project_id: str
     type: str = Field(..., description="milestone | task | review | audit")
     title: str
@@ -56,6 +66,8 @@ class TimelineItem(BaseModel):
 
 class Task(BaseModel):
     """Tasks attached to a timeline item"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     project_id: str
     timeline_item_id: str
     title: str
@@ -66,6 +78,8 @@ class Task(BaseModel):
 
 class Comment(BaseModel):
     """Comments attached to a timeline item or task"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     project_id: str
     timeline_item_id: Optional[str] = None
     task_id: Optional[str] = None
@@ -74,6 +88,8 @@ class Comment(BaseModel):
 
 class Document(BaseModel):
     """Documents associated with timeline items (metadata only)"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     project_id: str
     timeline_item_id: Optional[str] = None
     task_id: Optional[str] = None